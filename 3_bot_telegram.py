@@ -1,21 +1,31 @@
-import telebot
+from telebot.async_telebot import AsyncTeleBot
 from telebot import types
-import requests
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg')
+import aiohttp
+from aiohttp import web
+import asyncio
+import orjson
+from cachetools import LRUCache, TTLCache
+from aiolimiter import AsyncLimiter
+from PIL import Image
 import io
+import re
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from urllib.parse import urlparse
 from datetime import datetime, timedelta
-from currency_converter import CurrencyConverter
 import logging
 from dotenv import load_dotenv
 import os
+import time
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler()]
+    handlers=[logging.StreamHandler()],
+    force=True
 )
 logger = logging.getLogger(__name__)
 
@@ -26,18 +36,76 @@ load_dotenv()
 API_KEY = os.getenv("API_KEY")
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 
+# Webhook settings; long polling is used when WEBHOOK_URL is not set
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+
+# Webhook updates being handled in the background
+pending_updates = set()
+
 # Initialize bot
-bot = telebot.TeleBot(BOT_TOKEN)
+bot = AsyncTeleBot(BOT_TOKEN)
+
+# Shared HTTP session, created in main() once the event loop is running
+session = None
+
+# Outbound Telegram calls go through a queue limited to 30 messages/s overall
+# and 20 messages/min per chat. The queue is created in main().
+send_queue = None
+send_limiter = AsyncLimiter(30, 1)
+chat_limiters = TTLCache(maxsize=100000, ttl=60)
+pending_sends = set()
+
+# User data storage - bounded, idle sessions expire after an hour
+user_data = TTLCache(maxsize=100000, ttl=3600)
+
+# Rate caches: spot rates for 5 minutes, historical series for 6 hours.
+# The last_* caches keep the last good value per pair to fall back on when the API fails.
+rate_cache = TTLCache(maxsize=512, ttl=300)
+history_cache = TTLCache(maxsize=256, ttl=21600)
+last_rates = LRUCache(maxsize=512)
+last_history = LRUCache(maxsize=256)
+
+# Currency codes supported by FastForex, loaded at startup. A 404 from the API
+# marks the list as outdated; reloads happen at most every CURRENCY_RELOAD_INTERVAL seconds.
+valid_currencies = frozenset()
+currencies_outdated = True
+currencies_next_load = 0.0
+CURRENCY_RELOAD_INTERVAL = 300
+
+# FastForex API settings
+API_BASE_URL = 'https://api.fastforex.io'
+API_TIMEOUT = aiohttp.ClientTimeout(total=10)
+API_RETRIES = 3
+API_BACKOFF = 0.3
+API_RETRY_STATUSES = {502, 503, 504}
 
-# Initialize currency converter
-currency_converter = CurrencyConverter()
+# Shared figure reused by every graph render, created on first use so that
+# matplotlib is only loaded once someone asks for a graph. Each render process
+# gets its own copy and renders one graph at a time.
+FIG = AX = CANVAS = None
 
-# User data storage - more efficient than global variables
-user_data = {}
+# Worker processes for graph rendering, started on first use. Each worker loads
+# its own matplotlib, so the count stays small regardless of the core count.
+RENDER_WORKERS = min(2, os.cpu_count() or 1)
+RENDER_POOL = ProcessPoolExecutor(max_workers=RENDER_WORKERS)
+
+# Graph timeframes offered (in days); shorter ones are sliced from the longest
+GRAPH_TIMEFRAMES = frozenset({'7', '14', '30', '90'})
+MAX_GRAPH_DAYS = 90
 
 # Common currency pairs for quick access
 COMMON_PAIRS = ['USD/EUR', 'EUR/USD', 'USD/GBP', 'GBP/USD', 'GBP/EUR', 'EUR/GBP', 'USD/JPY', 'EUR/JPY']
 
+# Format of a currency pair typed by the user, e.g. USD/EUR
+PAIR_RE = re.compile(r'^([A-Z]{3})/([A-Z]{3})$')
+
+# Callback data of the common-pair buttons mapped to what they select
+CONVERT_ACTIONS = {f"convert_{pair.lower()}": tuple(pair.split('/')) for pair in COMMON_PAIRS}
+GRAPH_ACTIONS = {f"graph_{pair.lower()}": pair for pair in COMMON_PAIRS}
+
 # Helper functions
 def create_currency_keyboard(row_width=2):
     """Create an inline keyboard with common currency pairs."""
@@ -48,83 +116,288 @@ def create_currency_keyboard(row_width=2):
     markup.add(types.InlineKeyboardButton('View exchange rate graph', callback_data='show_graph_options'))
     return markup
 
-def get_exchange_rate(base_currency, target_currency):
-    """Get current exchange rate from FastForex API."""
-    url = f'https://api.fastforex.io/fetch-one?from={base_currency}&to={target_currency}&api_key={API_KEY}'
+def create_graph_keyboard():
+    """Create keyboard for graph currency selection."""
+    markup = types.InlineKeyboardMarkup(row_width=2)
+    buttons = [types.InlineKeyboardButton(pair, callback_data=f"graph_{pair.lower()}") for pair in COMMON_PAIRS]
+    markup.add(*buttons)
+    markup.add(types.InlineKeyboardButton('Custom pair', callback_data='custom_graph_pair'))
+    return markup
+
+@lru_cache(maxsize=64)
+def create_timeframe_keyboard(pair):
+    """Create keyboard for graph timeframe selection."""
+    markup = types.InlineKeyboardMarkup(row_width=2)
+    options = [
+        ('7 days', f"timeframe_{pair}_7"),
+        ('14 days', f"timeframe_{pair}_14"),
+        ('30 days', f"timeframe_{pair}_30"),
+        ('90 days', f"timeframe_{pair}_90")
+    ]
+    buttons = [types.InlineKeyboardButton(text, callback_data=data) for text, data in options]
+    markup.add(*buttons)
+    return markup
+
+# Keyboards are the same for every user, so build them once
+CONVERT_MARKUP = create_currency_keyboard()
+GRAPH_MARKUP = create_graph_keyboard()
+
+async def enqueue_send(chat_id, coro_factory):
+    """Queue a Telegram API call for chat_id and wait until it has been sent."""
+    limiter = chat_limiters.get(chat_id)
+    if limiter is None:
+        limiter = AsyncLimiter(20, 60)
+    # Re-inserting refreshes the TTL, so only idle chats (with a drained bucket) expire
+    chat_limiters[chat_id] = limiter
+    await limiter.acquire()
+    future = asyncio.get_running_loop().create_future()
+    await send_queue.put((coro_factory, future))
+    return await future
+
+async def deliver(coro_factory, future):
+    """Run a queued Telegram API call and pass its outcome to the waiting handler."""
+    try:
+        result = await coro_factory()
+    except Exception as e:
+        if not future.done():
+            future.set_exception(e)
+    else:
+        # The waiting handler may have been cancelled in the meantime
+        if not future.done():
+            future.set_result(result)
+
+async def process_send_queue():
+    """Start queued Telegram API calls no faster than the global rate limit."""
+    while True:
+        coro_factory, future = await send_queue.get()
+        await send_limiter.acquire()
+        task = asyncio.create_task(deliver(coro_factory, future))
+        pending_sends.add(task)
+        task.add_done_callback(pending_sends.discard)
+
+async def send_message(chat_id, text, **kwargs):
+    """Send a message through the rate-limited queue."""
+    return await enqueue_send(chat_id, lambda: bot.send_message(chat_id, text, **kwargs))
+
+async def send_photo(chat_id, photo, **kwargs):
+    """Send a photo through the rate-limited queue."""
+    return await enqueue_send(chat_id, lambda: bot.send_photo(chat_id, photo, **kwargs))
+
+async def edit_message_text(text, chat_id, message_id, **kwargs):
+    """Edit a message through the rate-limited queue."""
+    return await enqueue_send(chat_id, lambda: bot.edit_message_text(text, chat_id, message_id, **kwargs))
+
+def update_user_data(user_id, **values):
+    """Store values in the user's session and refresh its expiry."""
+    data = user_data.get(user_id, {})
+    data.update(values)
+    # Re-inserting refreshes the TTL, so only idle sessions expire
+    user_data[user_id] = data
+
+def register_next_step_handler(user_id, callback):
+    """Route the user's next text message to the given step handler."""
+    update_user_data(user_id, next_step=callback)
+
+async def fetch_api(endpoint, **params):
+    """GET a FastForex endpoint over the shared session, retrying transient failures."""
+    global currencies_outdated
+    params['api_key'] = API_KEY
+    for attempt in range(API_RETRIES + 1):
+        can_retry = attempt < API_RETRIES
+        try:
+            async with session.get(f'{API_BASE_URL}/{endpoint}', params=params, timeout=API_TIMEOUT) as response:
+                if response.status in API_RETRY_STATUSES and can_retry:
+                    # Drain the body so the connection returns to the pool before the backoff
+                    await response.read()
+                else:
+                    if response.status == 404:
+                        # The currency list may be outdated, reload it on next validation
+                        currencies_outdated = True
+                    response.raise_for_status()  # Raise exception for HTTP errors
+                    return orjson.loads(await response.read())
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if not can_retry:
+                raise
+        await asyncio.sleep(API_BACKOFF * 2 ** attempt)
+
+class UnsupportedCurrencyError(ValueError):
+    """Raised when a currency code is well-formed but not supported by FastForex."""
+
+async def load_valid_currencies():
+    """Load the set of currency codes supported by FastForex."""
+    global valid_currencies, currencies_outdated, currencies_next_load
+    currencies_next_load = time.monotonic() + CURRENCY_RELOAD_INTERVAL
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()  # Raise exception for HTTP errors
-        data = response.json()
+        data = await fetch_api('currencies')
+        valid_currencies = frozenset(data['currencies'])
+        currencies_outdated = False
+    except Exception as e:
+        logger.error("Failed to load currency list: %s", e)
+
+async def validate_pair(base, target):
+    """Raise UnsupportedCurrencyError if either currency is not supported by FastForex."""
+    if currencies_outdated and time.monotonic() >= currencies_next_load:
+        await load_valid_currencies()
+    # If the list is still unavailable, leave validation to the API
+    if valid_currencies:
+        for code in (base, target):
+            if code not in valid_currencies:
+                raise UnsupportedCurrencyError(f"Unsupported currency: {code}")
+
+async def fetch_exchange_rate(base_currency, target_currency):
+    """Fetch current exchange rate from FastForex API."""
+    try:
+        data = await fetch_api('fetch-one', **{'from': base_currency, 'to': target_currency})
         
         if 'result' in data:
             return data['result'][target_currency]
         else:
             raise Exception(f"API Error: {data.get('error', 'Unknown error')}")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Request error: {e}")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error("Request error: %s", e)
         raise Exception(f"Connection error: {str(e)}")
 
-def get_historical_rates(base_currency, target_currency, start_date, end_date):
-    """Get historical exchange rates from FastForex API."""
-    url = f'https://api.fastforex.io/time-series?from={base_currency}&to={target_currency}&start={start_date}&end={end_date}&api_key={API_KEY}'
+async def fetch_historical_rates(base_currency, target_currency, start_date, end_date):
+    """Fetch historical exchange rates from FastForex API."""
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        data = await fetch_api(
+            'time-series',
+            **{'from': base_currency, 'to': target_currency, 'start': start_date, 'end': end_date}
+        )
         
         if 'results' in data:
             return data['results']
         else:
             raise Exception(f"API Error: {data.get('error', 'Unknown error')}")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Request error: {e}")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error("Request error: %s", e)
         raise Exception(f"Connection error: {str(e)}")
 
-def create_currency_graph(base, target, days=7):
-    """Create a graph of exchange rates for the specified period."""
-    end_date = datetime.now().strftime('%Y-%m-%d')
-    start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+async def get_exchange_rate(base_currency, target_currency):
+    """Get exchange rate as (rate, stale), served from cache when possible.
+
+    If the API fails, the last known rate is returned with stale=True.
+    """
+    if base_currency == target_currency:
+        return 1.0, False
+    key = (base_currency, target_currency)
+    if key in rate_cache:
+        return rate_cache[key], False
+    try:
+        rate = await fetch_exchange_rate(base_currency, target_currency)
+    except Exception:
+        if key not in last_rates:
+            raise
+        logger.warning("Using stale rate for %s/%s", base_currency, target_currency)
+        return last_rates[key], True
+    rate_cache[key] = last_rates[key] = rate
+    return rate, False
+
+async def get_historical_rates(base_currency, target_currency, start_date, end_date):
+    """Get historical rates as (rates, stale), served from cache when possible.
+
+    If the API fails, the last known series for the pair, limited to the
+    requested range, is returned with stale=True.
+    """
+    key = (base_currency, target_currency, start_date, end_date)
+    if key in history_cache:
+        return history_cache[key], False
+    pair = (base_currency, target_currency)
+    try:
+        rates = await fetch_historical_rates(base_currency, target_currency, start_date, end_date)
+    except Exception:
+        stale_rates = {date: day_rates for date, day_rates in last_history.get(pair, {}).items()
+                       if date >= start_date}
+        if not stale_rates:
+            raise
+        logger.warning("Using stale history for %s/%s", base_currency, target_currency)
+        return stale_rates, True
+    history_cache[key] = last_history[pair] = rates
+    return rates, False
+
+def init_graph_figure():
+    """Import matplotlib and create the shared figure."""
+    global FIG, AX, CANVAS
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    FIG = Figure(figsize=(10, 6), dpi=100)
+    AX = FIG.subplots()
+    CANVAS = FigureCanvasAgg(FIG)
+
+def render_currency_graph(base, target, data):
+    """Render historical exchange rates as JPEG bytes (runs in a render process)."""
+    # Sort dates to ensure chronological order, then pack into typed arrays
+    items = sorted(data.items())
+    dates = np.array([date for date, _ in items], dtype='datetime64[D]')
+    rates = np.fromiter((day_rates[target] for _, day_rates in items), dtype=np.float64, count=len(items))
+    
+    if FIG is None:
+        init_graph_figure()
+    AX.clear()
+    AX.plot(dates, rates, marker='o', linestyle='-', color='#3498db', linewidth=2, markersize=8)
+    AX.set_title(f'{base} to {target} Exchange Rate', fontsize=16, fontweight='bold')
+    AX.set_xlabel('Date', fontsize=12)
+    AX.set_ylabel(f'1 {base} = X {target}', fontsize=12)
+    AX.grid(True, linestyle='--', alpha=0.7)
+    AX.tick_params(axis='x', labelrotation=45)
+    FIG.tight_layout()
+    
+    # Add current value label
+    if len(rates):
+        AX.annotate(f'Current: {rates[-1]:.4f}', 
+                    xy=(dates[-1], rates[-1]),
+                    xytext=(10, 15),
+                    textcoords='offset points',
+                    arrowprops=dict(arrowstyle='->', color='red'),
+                    color='black',
+                    bbox=dict(boxstyle='round,pad=0.5', fc='yellow', alpha=0.7))
+    
+    # Draw once and encode the raw pixels as JPEG, which is much smaller than PNG
+    CANVAS.draw()
+    img_buffer = io.BytesIO()
+    image = Image.frombuffer('RGBA', CANVAS.get_width_height(), CANVAS.buffer_rgba(), 'raw', 'RGBA', 0, 1)
+    image.convert('RGB').save(img_buffer, 'JPEG', quality=85, optimize=True)
+    AX.cla()
+    
+    return img_buffer.getvalue()
+
+async def render_in_pool(base, target, data):
+    """Render a graph in a worker process, replacing the pool if a worker dies."""
+    global RENDER_POOL
+    pool = RENDER_POOL
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pool, render_currency_graph, base, target, data)
+    except BrokenProcessPool:
+        # A dead worker breaks the whole pool and fails its pending renders,
+        # so start a fresh one (once, even if several renders fail together)
+        if RENDER_POOL is pool:
+            logger.warning("Render pool broke, starting a new one")
+            pool.shutdown(wait=False)
+            RENDER_POOL = ProcessPoolExecutor(max_workers=RENDER_WORKERS)
+        raise
+
+async def create_currency_graph(base, target, days=7):
+    """Create a graph of exchange rates, returned as (image bytes, stale)."""
+    now = datetime.now()
+    end_date = now.strftime('%Y-%m-%d')
+    start_date = (now - timedelta(days=days)).strftime('%Y-%m-%d')
+    # Always fetch the longest window so every timeframe shares one cached series
+    history_start = (now - timedelta(days=max(days, MAX_GRAPH_DAYS))).strftime('%Y-%m-%d')
     
     try:
-        data = get_historical_rates(base, target, start_date, end_date)
-        
-        # Sort dates to ensure chronological order
-        dates = sorted(data.keys())
-        rates = [data[date][target] for date in dates]
-        
-        plt.figure(figsize=(10, 6))
-        plt.plot(dates, rates, marker='o', linestyle='-', color='#3498db', linewidth=2, markersize=8)
-        plt.title(f'{base} to {target} Exchange Rate', fontsize=16, fontweight='bold')
-        plt.xlabel('Date', fontsize=12)
-        plt.ylabel(f'1 {base} = X {target}', fontsize=12)
-        plt.grid(True, linestyle='--', alpha=0.7)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        
-        # Add current value label
-        if dates and rates:
-            plt.annotate(f'Current: {rates[-1]:.4f}', 
-                        xy=(dates[-1], rates[-1]),
-                        xytext=(10, 15),
-                        textcoords='offset points',
-                        arrowprops=dict(arrowstyle='->', color='red'),
-                        color='black',
-                        bbox=dict(boxstyle='round,pad=0.5', fc='yellow', alpha=0.7))
-        
-        # Save graph to buffer
-        img_buffer = io.BytesIO()
-        plt.savefig(img_buffer, format='png', dpi=100)
-        img_buffer.seek(0)
-        plt.close()
+        history, stale = await get_historical_rates(base, target, history_start, end_date)
+        data = {date: rates for date, rates in history.items() if date >= start_date}
         
-        return img_buffer
+        graph_bytes = await render_in_pool(base, target, data)
+        return graph_bytes, stale
     except Exception as e:
-        logger.error(f"Graph creation error: {e}")
+        logger.error("Graph creation error: %s", e)
         raise Exception(f"Failed to create graph: {str(e)}")
 
 # Command handlers
 @bot.message_handler(commands=['start'])
-def start_command(message):
+async def start_command(message):
     """Handle /start command."""
     user_id = message.from_user.id
     user_name = message.from_user.first_name
@@ -140,10 +413,10 @@ def start_command(message):
         f"Let's get started! Use /convert to convert currencies."
     )
     
-    bot.send_message(message.chat.id, welcome_text)
+    await send_message(message.chat.id, welcome_text)
 
 @bot.message_handler(commands=['help'])
-def help_command(message):
+async def help_command(message):
     """Handle /help command."""
     help_text = (
         "📚 *Currency Converter Bot Help*\n\n"
@@ -168,10 +441,10 @@ def help_command(message):
         "When entering custom currency pairs, use the format: USD/EUR"
     )
     
-    bot.send_message(message.chat.id, help_text, parse_mode='Markdown')
+    await send_message(message.chat.id, help_text, parse_mode='Markdown')
 
 @bot.message_handler(commands=['info'])
-def info_command(message):
+async def info_command(message):
     """Handle /info command."""
     info_text = (
         "ℹ️ *Currency Converter Bot Info*\n\n"
@@ -192,47 +465,26 @@ def info_command(message):
         "Created with ❤️ by Alikhan"
     )
     
-    bot.send_message(message.chat.id, info_text, parse_mode='Markdown')
+    await send_message(message.chat.id, info_text, parse_mode='Markdown')
 
 @bot.message_handler(commands=['convert'])
-def convert_command(message):
+async def convert_command(message):
     """Handle /convert command."""
     user_id = message.from_user.id
-    bot.send_message(message.chat.id, "Enter the amount you want to convert:")
-    bot.register_next_step_handler(message, process_amount)
+    await send_message(message.chat.id, "Enter the amount you want to convert:")
+    register_next_step_handler(user_id, process_amount)
 
 @bot.message_handler(commands=['graph'])
-def graph_command(message):
+async def graph_command(message):
     """Handle /graph command."""
-    bot.send_message(
+    await send_message(
         message.chat.id, 
         "Choose a currency pair for the graph:",
-        reply_markup=create_graph_keyboard()
+        reply_markup=GRAPH_MARKUP
     )
 
-def create_graph_keyboard():
-    """Create keyboard for graph currency selection."""
-    markup = types.InlineKeyboardMarkup(row_width=2)
-    buttons = [types.InlineKeyboardButton(pair, callback_data=f"graph_{pair.lower()}") for pair in COMMON_PAIRS]
-    markup.add(*buttons)
-    markup.add(types.InlineKeyboardButton('Custom pair', callback_data='custom_graph_pair'))
-    return markup
-
-def create_timeframe_keyboard(pair):
-    """Create keyboard for graph timeframe selection."""
-    markup = types.InlineKeyboardMarkup(row_width=2)
-    options = [
-        ('7 days', f"timeframe_{pair}_7"),
-        ('14 days', f"timeframe_{pair}_14"),
-        ('30 days', f"timeframe_{pair}_30"),
-        ('90 days', f"timeframe_{pair}_90")
-    ]
-    buttons = [types.InlineKeyboardButton(text, callback_data=data) for text, data in options]
-    markup.add(*buttons)
-    return markup
-
 # Step handlers
-def process_amount(message):
+async def process_amount(message):
     """Process the amount entered by the user."""
     user_id = message.from_user.id
     try:
@@ -241,203 +493,196 @@ def process_amount(message):
             raise ValueError("Amount must be positive")
         
         # Store the amount in user data
-        if user_id not in user_data:
-            user_data[user_id] = {}
-        user_data[user_id]['amount'] = amount
+        update_user_data(user_id, amount=amount)
         
         # Show currency options
-        bot.send_message(
+        await send_message(
             message.chat.id,
             f"Converting {amount:.2f}. Choose a currency pair:",
-            reply_markup=create_currency_keyboard()
+            reply_markup=CONVERT_MARKUP
         )
     except ValueError:
-        bot.send_message(
+        await send_message(
             message.chat.id, 
             "⚠️ Please enter a valid positive number. Try again:"
         )
-        bot.register_next_step_handler(message, process_amount)
+        register_next_step_handler(user_id, process_amount)
 
-def process_custom_pair(message):
+async def process_custom_pair(message):
     """Process custom currency pair entered by the user."""
     user_id = message.from_user.id
     try:
         # Validate format
         pair = message.text.strip().upper()
-        currencies = pair.split('/')
-        
-        if len(currencies) != 2 or not all(len(c) == 3 for c in currencies):
+        match = PAIR_RE.match(pair)
+        if not match:
             raise ValueError("Invalid format")
         
-        base, target = currencies
+        base, target = match.groups()
+        await validate_pair(base, target)
         
         # Get the conversion
         amount = user_data.get(user_id, {}).get('amount', 0)
         try:
-            rate = currency_converter.convert(1, base, target)
-            result = amount * rate
-            
-            bot.send_message(
-                message.chat.id,
-                f"💱 *Conversion Result:*\n\n"
-                f"{amount:.2f} {base} = {result:.2f} {target}\n"
-                f"Rate: 1 {base} = {rate:.4f} {target}\n\n"
-                f"Use /convert to convert another amount.",
-                parse_mode='Markdown'
-            )
-        except Exception as e:
-            # Try with FastForex API if CurrencyConverter fails
-            try:
-                rate = get_exchange_rate(base, target)
-                result = amount * rate
-                
-                bot.send_message(
-                    message.chat.id,
-                    f"💱 *Conversion Result:*\n\n"
-                    f"{amount:.2f} {base} = {result:.2f} {target}\n"
-                    f"Rate: 1 {base} = {rate:.4f} {target}\n\n"
-                    f"Use /convert to convert another amount.",
-                    parse_mode='Markdown'
-                )
-            except Exception as api_e:
-                raise Exception(f"Currency conversion failed: {str(api_e)}")
+            rate, stale = await get_exchange_rate(base, target)
+        except Exception as api_e:
+            raise Exception(f"Currency conversion failed: {str(api_e)}")
+        result = amount * rate
+        
+        await send_message(
+            message.chat.id,
+            f"💱 *Conversion Result:*\n\n"
+            f"{amount:.2f} {base} = {result:.2f} {target}\n"
+            f"Rate: 1 {base} = {rate:.4f} {target}{' (stale)' if stale else ''}\n\n"
+            f"Use /convert to convert another amount.",
+            parse_mode='Markdown'
+        )
+    
+    except UnsupportedCurrencyError as e:
+        await send_message(
+            message.chat.id,
+            f"⚠️ {str(e)}. Please enter a supported currency pair (e.g., USD/EUR):"
+        )
+        register_next_step_handler(user_id, process_custom_pair)
     
     except ValueError:
-        bot.send_message(
+        await send_message(
             message.chat.id,
             "⚠️ Invalid format. Please use the format: USD/EUR"
         )
-        bot.register_next_step_handler(message, process_custom_pair)
+        register_next_step_handler(user_id, process_custom_pair)
     
     except Exception as e:
-        bot.send_message(
+        await send_message(
             message.chat.id,
             f"❌ Error: {str(e)}\n\nPlease try a different currency pair."
         )
-        bot.send_message(
+        await send_message(
             message.chat.id,
             "Enter a currency pair (e.g., USD/EUR):"
         )
-        bot.register_next_step_handler(message, process_custom_pair)
+        register_next_step_handler(user_id, process_custom_pair)
 
-def process_custom_graph_pair(message):
+async def process_custom_graph_pair(message):
     """Process custom currency pair for graph."""
     try:
         # Validate format
         pair = message.text.strip().upper()
-        currencies = pair.split('/')
-        
-        if len(currencies) != 2 or not all(len(c) == 3 for c in currencies):
+        match = PAIR_RE.match(pair)
+        if not match:
             raise ValueError("Invalid format")
         
-        base, target = currencies
+        base, target = match.groups()
+        await validate_pair(base, target)
         
         # Store the pair and show timeframe options
         user_id = message.from_user.id
-        if user_id not in user_data:
-            user_data[user_id] = {}
-        
-        user_data[user_id]['graph_pair'] = pair
+        update_user_data(user_id, graph_pair=pair)
         
         # Show timeframe options
-        bot.send_message(
+        await send_message(
             message.chat.id,
             f"Select time period for {base}/{target} graph:",
             reply_markup=create_timeframe_keyboard(pair.lower())
         )
         
+    except UnsupportedCurrencyError as e:
+        await send_message(
+            message.chat.id,
+            f"⚠️ {str(e)}. Please enter a supported currency pair (e.g., USD/EUR):"
+        )
+        register_next_step_handler(message.from_user.id, process_custom_graph_pair)
+    
     except ValueError:
-        bot.send_message(
+        await send_message(
             message.chat.id,
             "⚠️ Invalid format. Please use the format: USD/EUR"
         )
-        bot.register_next_step_handler(message, process_custom_graph_pair)
+        register_next_step_handler(message.from_user.id, process_custom_graph_pair)
     
     except Exception as e:
-        bot.send_message(
+        await send_message(
             message.chat.id,
             f"❌ Error: {str(e)}\n\nPlease try a different currency pair."
         )
-        bot.send_message(
+        await send_message(
             message.chat.id,
             "Enter a currency pair (e.g., USD/EUR):"
         )
-        bot.register_next_step_handler(message, process_custom_graph_pair)
+        register_next_step_handler(message.from_user.id, process_custom_graph_pair)
 
 # Callback query handlers
 @bot.callback_query_handler(func=lambda call: True)
-def handle_callback_query(call):
+async def handle_callback_query(call):
     """Handle all callback queries."""
     user_id = call.from_user.id
     
     try:
         # Convert currency callbacks
-        if call.data.startswith('convert_'):
-            pair = call.data.replace('convert_', '')
-            base, target = pair.upper().split('/')
+        if call.data in CONVERT_ACTIONS:
+            base, target = CONVERT_ACTIONS[call.data]
             amount = user_data.get(user_id, {}).get('amount', 0)
             
-            try:
-                rate = currency_converter.convert(1, base, target)
-                result = amount * rate
-            except Exception:
-                # Fallback to API
-                rate = get_exchange_rate(base, target)
-                result = amount * rate
+            rate, stale = await get_exchange_rate(base, target)
+            result = amount * rate
             
-            bot.send_message(
+            await send_message(
                 call.message.chat.id,
                 f"💱 *Conversion Result:*\n\n"
                 f"{amount:.2f} {base} = {result:.2f} {target}\n"
-                f"Rate: 1 {base} = {rate:.4f} {target}\n\n"
+                f"Rate: 1 {base} = {rate:.4f} {target}{' (stale)' if stale else ''}\n\n"
                 f"Use /convert to convert another amount.",
                 parse_mode='Markdown'
             )
         
         # Custom pair callback
         elif call.data == 'custom_pair':
-            bot.send_message(
+            await send_message(
                 call.message.chat.id,
                 "Enter a currency pair (e.g., USD/EUR):"
             )
-            bot.register_next_step_handler(call.message, process_custom_pair)
+            register_next_step_handler(user_id, process_custom_pair)
         
         # Graph callbacks
-        elif call.data.startswith('graph_'):
-            pair = call.data.replace('graph_', '')
+        elif call.data in GRAPH_ACTIONS:
+            pair = GRAPH_ACTIONS[call.data]
             # Store the pair for later use
-            if user_id not in user_data:
-                user_data[user_id] = {}
-            user_data[user_id]['graph_pair'] = pair.upper()
+            update_user_data(user_id, graph_pair=pair)
             
             # Show timeframe options
-            bot.send_message(
+            await send_message(
                 call.message.chat.id,
-                f"Select time period for {pair.upper()} graph:",
-                reply_markup=create_timeframe_keyboard(pair)
+                f"Select time period for {pair} graph:",
+                reply_markup=create_timeframe_keyboard(pair.lower())
             )
         
         # Custom graph pair callback
         elif call.data == 'custom_graph_pair':
-            bot.send_message(
+            await send_message(
                 call.message.chat.id,
                 "Enter a currency pair for the graph (e.g., USD/EUR):"
             )
-            bot.register_next_step_handler(call.message, process_custom_graph_pair)
+            register_next_step_handler(user_id, process_custom_graph_pair)
         
         # Timeframe callbacks
         elif call.data.startswith('timeframe_'):
-            # Extract pair and days
-            _, pair, days = call.data.split('_')
+            # Extract pair and days, ignoring malformed data without replying
+            pair, _, days = call.data[len('timeframe_'):].rpartition('_')
+            if days not in GRAPH_TIMEFRAMES:
+                await bot.answer_callback_query(call.id)
+                return
             days = int(days)
             
-            if user_id in user_data and 'graph_pair' in user_data[user_id]:
-                pair = user_data[user_id]['graph_pair']
+            pair = user_data.get(user_id, {}).get('graph_pair', pair)
+            match = PAIR_RE.match(pair.upper())
+            if not match:
+                await bot.answer_callback_query(call.id)
+                return
             
-            base, target = pair.upper().split('/')
+            base, target = match.groups()
             
             # Send "generating" message
-            processing_msg = bot.send_message(
+            processing_msg = await send_message(
                 call.message.chat.id,
                 f"📊 Generating {days}-day graph for {base}/{target}...\n"
                 f"This may take a moment."
@@ -445,20 +690,21 @@ def handle_callback_query(call):
             
             try:
                 # Create and send graph
-                graph_buffer = create_currency_graph(base, target, days)
+                graph_bytes, stale = await create_currency_graph(base, target, days)
                 
-                bot.send_photo(
+                await send_photo(
                     call.message.chat.id,
-                    graph_buffer,
-                    caption=f"📈 {base}/{target} exchange rate over the past {days} days.\n"
+                    graph_bytes,
+                    caption=f"📈 {base}/{target} exchange rate over the past {days} days"
+                            f"{' (stale)' if stale else ''}.\n"
                             f"Use /graph to view a different graph."
                 )
                 
                 # Delete processing message
-                bot.delete_message(call.message.chat.id, processing_msg.message_id)
+                await bot.delete_message(call.message.chat.id, processing_msg.message_id)
                 
             except Exception as e:
-                bot.edit_message_text(
+                await edit_message_text(
                     f"❌ Error generating graph: {str(e)}",
                     call.message.chat.id,
                     processing_msg.message_id
@@ -466,38 +712,98 @@ def handle_callback_query(call):
         
         # Show graph options callback
         elif call.data == 'show_graph_options':
-            bot.send_message(
+            await send_message(
                 call.message.chat.id,
                 "Choose a currency pair for the graph:",
-                reply_markup=create_graph_keyboard()
+                reply_markup=GRAPH_MARKUP
             )
         
         # Answer callback query to remove loading state
-        bot.answer_callback_query(call.id)
+        await bot.answer_callback_query(call.id)
         
     except Exception as e:
-        logger.error(f"Callback error: {e}")
-        bot.answer_callback_query(call.id)
-        bot.send_message(
+        logger.error("Callback error: %s", e)
+        await bot.answer_callback_query(call.id)
+        await send_message(
             call.message.chat.id,
             f"❌ An error occurred: {str(e)}\n\nPlease try again or use /help."
         )
 
+# Step dispatcher
+@bot.message_handler(func=lambda message: 'next_step' in user_data.get(message.from_user.id, {}))
+async def handle_next_step(message):
+    """Pass the message to the step handler waiting for this user."""
+    # The session may expire between the filter check and this handler
+    step = user_data.get(message.from_user.id, {}).pop('next_step', None)
+    if step:
+        await step(message)
+
 # Error handler
 @bot.message_handler(func=lambda message: True)
-def handle_all_messages(message):
+async def handle_all_messages(message):
     """Handle all other messages."""
-    bot.send_message(
+    await send_message(
         message.chat.id,
         "I don't understand that command. Please use /help to see available commands."
     )
 
+# Webhook server
+async def handle_webhook(request):
+    """Receive an update pushed by Telegram and dispatch it to the handlers."""
+    if WEBHOOK_SECRET and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != WEBHOOK_SECRET:
+        return web.Response(status=403)
+    try:
+        update = types.Update.de_json(orjson.loads(await request.read()))
+    except (ValueError, TypeError, KeyError):
+        return web.Response(status=400)
+    # Reply right away; Telegram redelivers updates whose webhook call is slow
+    task = asyncio.create_task(bot.process_new_updates([update]))
+    pending_updates.add(task)
+    task.add_done_callback(pending_updates.discard)
+    return web.Response()
+
+async def run_webhook():
+    """Serve the webhook endpoint and register it with Telegram."""
+    app = web.Application()
+    app.router.add_post(urlparse(WEBHOOK_URL).path or '/', handle_webhook)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+        await bot.set_webhook(url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET)
+        logger.info("Listening for webhook updates on %s:%s", WEBHOOK_HOST, WEBHOOK_PORT)
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
 # Main entry point
+async def main():
+    """Open the shared HTTP session and run the bot until stopped."""
+    global session, send_queue
+    # Pooled keep-alive connections so API calls skip the TCP/TLS handshake
+    connector = aiohttp.TCPConnector(limit=20, limit_per_host=10)
+    session = aiohttp.ClientSession(connector=connector)
+    send_queue = asyncio.Queue()
+    sender = asyncio.create_task(process_send_queue())
+    try:
+        await load_valid_currencies()
+        if WEBHOOK_URL:
+            await run_webhook()
+        else:
+            # Polling fails while a webhook is registered, so clear any old one
+            await bot.remove_webhook()
+            await bot.infinity_polling(timeout=60)
+    finally:
+        sender.cancel()
+        RENDER_POOL.shutdown(wait=False)
+        await session.close()
+        await bot.close_session()
+
 if __name__ == "__main__":
     try:
         logger.info("Starting Currency Converter Bot...")
-        bot.infinity_polling(timeout=60, long_polling_timeout=60)
+        asyncio.run(main())
     except Exception as e:
-        logger.error(f"Error in main loop: {e}")
+        logger.error("Error in main loop: %s", e)
 
 